@@ -1,17 +1,48 @@
+import asyncio
+import hashlib
 import json
 import sqlite3
 import requests
+from requests.adapters import HTTPAdapter
+import urllib3
+from urllib3.util.retry import Retry
 import os
+import queue
 import re
+import shutil
 import zipfile
 import threading
 import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox
 import webbrowser
 
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 # === CONFIG ===
 SONGDATA_DB = "songdata.db"
+CACHE_DIR = ".cache"
+# connection-local only; songdata.db belongs to the game and is opened read-only
+SONGDATA_PRAGMAS = (
+    "PRAGMA cache_size=-65536",
+    "PRAGMA temp_store=MEMORY",
+)
+# per-map index probes are used while candidates * ratio < rows in song (and song.md5 is indexed)
+MD5_LOOKUP_RATIO = 8
 JSON_URLS = {
     "7K + 8K": "https://air-afother.github.io/osu-table/osu_mania_7k_8k_final.json",
     "4K": "https://air-afother.github.io/osu-table/osu_mania_4k_final.json"
@@ -22,110 +53,473 @@ TABLE_URLS = {
 }
 NERINYAN_BASE = "https://api.nerinyan.moe/d/"
 HEADERS = {"User-Agent": "osu-downloader/1.0"}
+DOWNLOAD_CHUNK_SIZE = 128 * 1024
+ZIP_MAGIC = b"PK\x03\x04"
+DOWNLOAD_WORKERS = 8
+ASYNC_DOWNLOAD_LIMIT = 32
+DOWNLOAD_RETRIES = 3
+RETRY_STATUSES = (429, 502, 503, 504)
+EXTRACT_WORKERS = min(8, os.cpu_count() or 4)
+EXTRACT_QUEUE_SIZE = 16
+PROGRESS_INTERVAL_MS = 100
+
+
+# shared session: keeps connections to github.io and nerinyan alive across requests and
+# retries rate limits / transient server errors with backoff
+SESSION = requests.Session()
+SESSION.headers.update(HEADERS)
+SESSION.mount("https://", HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=max(16, DOWNLOAD_WORKERS * 2),
+    max_retries=Retry(total=DOWNLOAD_RETRIES, backoff_factor=0.5, status_forcelist=RETRY_STATUSES),
+))
 
 
 # === Helper functions ===
 
-def get_existing_md5():
-    """Return set of md5 hashes present in local song database."""
-    if not os.path.exists(SONGDATA_DB):
-        messagebox.showerror("Error", f"Database not found: {SONGDATA_DB}")
-        return set()
-
-    conn = sqlite3.connect(SONGDATA_DB)
-    cur = conn.cursor()
-    cur.execute("SELECT md5 FROM song")
-    md5_list = {row[0] for row in cur.fetchall()}
-    conn.close()
-    return md5_list
+_BEATMAPSET_RE = re.compile(r"beatmapsets/(\d+)")
+_INVALID_FILENAME_CHARS = str.maketrans("", "", '\\/*?:"<>|')
+_CONTENT_RANGE_RE = re.compile(r"bytes (\d+)-")
+
+
+def _connect_songdata():
+    """Open the local song database read-only, tuned for read-heavy lookups."""
+    conn = sqlite3.connect(f"file:{SONGDATA_DB}?mode=ro", uri=True)
+    try:
+        for pragma in SONGDATA_PRAGMAS:
+            conn.execute(pragma)
+    except sqlite3.Error:
+        conn.close()
+        raise
+    return conn
+
+
+def _song_md5_indexed(conn):
+    """Return True if some index on song starts with the md5 column."""
+    return conn.execute(
+        "SELECT 1 FROM pragma_index_list('song') AS il, pragma_index_info(il.name) AS ii "
+        "WHERE ii.seqno = 0 AND ii.name = 'md5' LIMIT 1").fetchone() is not None
+
+
+def get_missing_maps(maps):
+    """Return the maps whose md5 is not present in local song database. maps is a dict of md5 -> map."""
+    conn = _connect_songdata()
+    try:
+        # only the index and "more than limit rows" matter, so the count stops at limit + 1
+        # instead of scanning all of song
+        limit = len(maps) * MD5_LOOKUP_RATIO
+        if _song_md5_indexed(conn) and conn.execute(
+                "SELECT COUNT(*) FROM (SELECT 1 FROM song LIMIT ?)", (limit + 1,)).fetchone()[0] > limit:
+            # few candidates against a large database: probe the md5 index per map
+            cur = conn.cursor()
+            return [m for md, m in maps.items()
+                    if cur.execute("SELECT 1 FROM song WHERE md5 = ? LIMIT 1", (md,)).fetchone() is None]
+
+        # otherwise let SQLite do the anti-join in one transaction; the LEFT JOIN lets it use
+        # the md5 index, or build a temporary automatic one when the database has none
+        with conn:
+            conn.execute("CREATE TEMP TABLE cand(md5 TEXT PRIMARY KEY)")
+            conn.executemany("INSERT OR IGNORE INTO cand(md5) VALUES (?)", ((md,) for md in maps))
+            missing_md5 = {row[0] for row in conn.execute(
+                "SELECT cand.md5 FROM cand LEFT JOIN song ON song.md5 = cand.md5 WHERE song.md5 IS NULL")}
+        return [m for md, m in maps.items() if md in missing_md5]
+    finally:
+        conn.close()
+
+
+def _iter_json_items(f):
+    """Yield the elements of the top-level JSON array in file f, streaming with ijson when installed."""
+    if ijson is not None:
+        yield from ijson.items(f, "item", use_float=True)
+    elif orjson is not None:
+        yield from orjson.loads(f.read())
+    else:
+        yield from json.load(f)
+
+
+def _remove_quietly(path):
+    """Remove path, ignoring errors (e.g. it does not exist)."""
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def _write_json_atomic(path, data):
+    """Write data as JSON to path via a temporary file; on failure path is removed instead."""
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, path)
+    except OSError:
+        # a stale sidecar must not outlive the data it describes
+        _remove_quietly(tmp_path)
+        _remove_quietly(path)
 
 
 def get_all_maps(url):
-    """Download and return JSON with all maps from given URL."""
-    response = requests.get(url, headers=HEADERS)
-    response.raise_for_status()
-    return response.json()
+    """Yield all maps from the JSON at given URL, revalidating a local cached copy."""
+    key = hashlib.sha1(url.encode("utf-8")).hexdigest()
+    body_path = os.path.join(CACHE_DIR, f"{key}.json")
+    meta_path = os.path.join(CACHE_DIR, f"{key}.meta.json")
+
+    meta = {}
+    if os.path.exists(body_path) and os.path.exists(meta_path):
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except Exception:
+            meta = {}
+
+    headers = {}
+    if meta.get("etag"):
+        headers["If-None-Match"] = meta["etag"]
+    if meta.get("last_modified"):
+        headers["If-Modified-Since"] = meta["last_modified"]
+
+    with SESSION.get(url, headers=headers, stream=True) as response:
+        if response.status_code != 304:
+            response.raise_for_status()
+            response.raw.decode_content = True
+            # stream the body to disk instead of holding it (and its parsed list) in memory
+            tmp_path = f"{body_path}.tmp"
+            try:
+                os.makedirs(CACHE_DIR, exist_ok=True)
+                f = open(tmp_path, "wb")
+            except OSError:
+                # caching is best effort; without a writable cache parse straight from the response
+                yield from _iter_json_items(response.raw)
+                return
+            try:
+                with f:
+                    shutil.copyfileobj(response.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+                os.replace(tmp_path, body_path)
+            except BaseException:
+                _remove_quietly(tmp_path)
+                raise
+            _write_json_atomic(meta_path, {"etag": response.headers.get("ETag"),
+                                           "last_modified": response.headers.get("Last-Modified")})
+
+    with open(body_path, "rb") as f:
+        yield from _iter_json_items(f)
 
 
 def extract_beatmapset_id(url: str):
     """Extract beatmapset ID from osu URL."""
-    match = re.search(r"beatmapsets/(\d+)", url)
+    match = _BEATMAPSET_RE.search(url)
     return match.group(1) if match else None
 
 
 def sanitize_filename(name: str):
     """Remove invalid characters from filenames."""
-    return re.sub(r'[\\/*?:"<>|]', "", name)
+    return name.translate(_INVALID_FILENAME_CHARS)
+
+
+def allowed_levels(min_i, max_i):
+    """
+    Return the levels between min_i and max_i inclusive, in half steps (3, 3.5, 4, ...).
+    Both the feed's string form ("3", "3.5") and numeric values are included, so a level
+    can be checked with a set lookup instead of parsing it with float().
+    """
+    levels = [i / 2 for i in range(min_i * 2, max_i * 2 + 1)]
+    return frozenset([str(int(x)) if x.is_integer() else str(x) for x in levels] + levels)
+
+
+def _osz_filename(m):
+    """Return (beatmapset id, .osz filename) for map m, or None if its URL has no beatmapset."""
+    beatmapset_id = extract_beatmapset_id(m["url"])
+    if not beatmapset_id:
+        return None
+    return beatmapset_id, f"{sanitize_filename(m['title'])} - {sanitize_filename(m['artist'])} [{beatmapset_id}].osz"
+
+
+def _resume_state(part_path):
+    """
+    Return (resume_from, headers) for continuing part_path. A .part is only resumed when the
+    validator of the response it came from was saved, so If-Range can confirm the archive
+    on the server is still the same one; otherwise the download starts from zero.
+    """
+    try:
+        resume_from = os.path.getsize(part_path)
+        with open(f"{part_path}.meta", "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return 0, {}
+
+    # If-Range needs a strong ETag; Last-Modified is the fallback validator
+    etag = meta.get("etag")
+    validator = etag if etag and not etag.startswith("W/") else meta.get("last_modified")
+    if not resume_from or not validator:
+        return 0, {}
+    # byte ranges refer to the encoded body, so ask for it unencoded
+    return resume_from, {"Range": f"bytes={resume_from}-", "If-Range": validator, "Accept-Encoding": "identity"}
+
+
+def _stale_part(status, headers, resume_from):
+    """Return True if a resume request was rejected or the 206 does not continue at resume_from."""
+    if not resume_from:
+        return False
+    if status == 416:
+        return True
+    if status != 206:
+        return False
+    # Content-Range: bytes <start>-<end>/<total>
+    match = _CONTENT_RANGE_RE.match(headers.get("Content-Range", ""))
+    return match is None or int(match.group(1)) != resume_from
+
+
+def _start_part(part_path, headers):
+    """Record the validator of a fresh download so a later run can resume it with If-Range."""
+    _write_json_atomic(f"{part_path}.meta", {"etag": headers.get("ETag"),
+                                             "last_modified": headers.get("Last-Modified")})
+
+
+def _discard_part(part_path):
+    """Remove a .part file and its validator."""
+    _remove_quietly(part_path)
+    _remove_quietly(f"{part_path}.meta")
+
+
+def _finish_part(part_path, filepath):
+    """Move a completed .part into place."""
+    os.replace(part_path, filepath)
+    _remove_quietly(f"{part_path}.meta")
+
+
+def _download_target(m, download_root, existing_files):
+    """
+    Return (download url, .osz path, .part path) for map m. The .part path is None when
+    the .osz is already in download_root (existing_files, used instead of a stat per map),
+    in which case the path is still returned so a pipelined extractor picks it up.
+    """
+    beatmapset_id, filename = _osz_filename(m)
+    download_url = f"{NERINYAN_BASE}{beatmapset_id}"
+    filepath = os.path.join(download_root, filename)
+    if filename in existing_files:
+        return download_url, filepath, None
+    # data is written to a .part file first so an interrupted download can be resumed
+    return download_url, filepath, f"{filepath}.part"
+
+
+def _open_part(part_path, resume_from, status, headers, first):
+    """
+    Open part_path for a response body whose first block is first, and write that block.
+    A valid resume (206) appends; anything else starts the .part over, after checking the
+    zip signature, since .osz files are zips and anything else is an error page whatever
+    its size. Returns None in that case.
+    """
+    if resume_from and status == 206:
+        f = open(part_path, "ab")
+    elif first.startswith(ZIP_MAGIC):
+        _start_part(part_path, headers)
+        f = open(part_path, "wb")
+    else:
+        return None
+    f.write(first)
+    return f
+
+
+def _download_one(session, m, download_root, existing_files=frozenset()):
+    """Download a single beatmapset into download_root. Returns the .osz path or None."""
+    download_url, filepath, part_path = _download_target(m, download_root, existing_files)
+    if part_path is None:
+        return filepath
+
+    # SESSION's Retry adapter only covers the request itself; errors while reading the body
+    # are retried here with the same backoff, resuming from whatever reached the .part
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            return _fetch(session, download_url, filepath, part_path)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.ChunkedEncodingError,
+                urllib3.exceptions.ProtocolError, urllib3.exceptions.ReadTimeoutError):
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+        time.sleep(0.5 * 2 ** attempt)
+
+
+def _fetch(session, download_url, filepath, part_path):
+    """One attempt at downloading download_url into filepath via part_path. Returns filepath or None."""
+    # a second pass only happens after a stale .part was discarded
+    for _ in range(2):
+        resume_from, headers = _resume_state(part_path)
+        with session.get(download_url, stream=True, timeout=30, headers=headers) as r:
+            if _stale_part(r.status_code, r.headers, resume_from):
+                # the partial file no longer matches what the server has; start over
+                _discard_part(part_path)
+                continue
+            r.raise_for_status()
+            r.raw.decode_content = True
+
+            f = _open_part(part_path, resume_from, r.status_code, r.headers, r.raw.read(DOWNLOAD_CHUNK_SIZE))
+            if f is None:
+                return None
+            # copy the rest straight from the raw stream, skipping iter_content's per-chunk overhead
+            with f:
+                shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
+
+        _finish_part(part_path, filepath)
+        return filepath
+    return None
+
+
+async def _fetch_async(session, download_url, filepath, part_path):
+    """aiohttp counterpart of _fetch."""
+    for _ in range(2):
+        resume_from, headers = _resume_state(part_path)
+        async with session.get(download_url, headers=headers) as r:
+            if _stale_part(r.status, r.headers, resume_from):
+                _discard_part(part_path)
+                continue
+            r.raise_for_status()
+
+            # read at least enough to check the zip signature
+            first = b""
+            while len(first) < len(ZIP_MAGIC):
+                chunk = await r.content.read(DOWNLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                first += chunk
+            f = _open_part(part_path, resume_from, r.status, r.headers, first)
+            if f is None:
+                return None
+            with f:
+                async for chunk in r.content.iter_chunked(DOWNLOAD_CHUNK_SIZE):
+                    f.write(chunk)
+
+        _finish_part(part_path, filepath)
+        return filepath
+    return None
+
+
+async def _download_one_async(session, m, download_root, existing_files=frozenset()):
+    """aiohttp counterpart of _download_one. Returns the .osz path or None."""
+    download_url, filepath, part_path = _download_target(m, download_root, existing_files)
+    if part_path is None:
+        return filepath
+
+    # retry connection errors, timeouts and rate limits / transient server errors with
+    # backoff, like SESSION's Retry adapter; a retry resumes from whatever reached the .part
+    for attempt in range(DOWNLOAD_RETRIES + 1):
+        try:
+            return await _fetch_async(session, download_url, filepath, part_path)
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            if isinstance(e, aiohttp.ClientResponseError) and e.status not in RETRY_STATUSES:
+                raise
+            if attempt == DOWNLOAD_RETRIES:
+                raise
+        await asyncio.sleep(0.5 * 2 ** attempt)
+
+
+async def _download_all(sets, download_root, existing_files, on_finished):
+    """Download sets (map -> count) on one event loop, calling on_finished(filepath or None, count) for each."""
+    connector = aiohttp.TCPConnector(limit=ASYNC_DOWNLOAD_LIMIT, ttl_dns_cache=300)
+    timeout = aiohttp.ClientTimeout(total=None, sock_connect=30, sock_read=30)
+    # trust_env picks up HTTP(S)_PROXY and .netrc like requests does
+    async with aiohttp.ClientSession(connector=connector, timeout=timeout, headers=HEADERS, trust_env=True) as session:
+        async def run(m, count):
+            try:
+                filepath = await _download_one_async(session, m, download_root, existing_files)
+            except Exception:
+                # on failure, skip (we still count it to avoid stalling)
+                filepath = None
+            # on_finished may block on the bounded extract queue, so keep it off the loop
+            await asyncio.to_thread(on_finished, filepath, count)
 
+        await asyncio.gather(*(run(m, count) for m, count in sets))
 
-def download_missing_maps(missing_maps, download_root, progress_callback):
+
+def download_missing_maps(missing_maps, download_root, progress_callback, extract_queue=None):
     """
     Download missing maps from nerinyan. For each map, progress_callback(done, total, start_time) is called.
+    If extract_queue is given, the path of every finished .osz is put on it as soon as it lands.
     """
     os.makedirs(download_root, exist_ok=True)
+    with os.scandir(download_root) as it:
+        existing_files = {entry.name for entry in it}
     total = len(missing_maps)
     done = 0
+    done_lock = threading.Lock()
     start_time = time.time()
 
+    def on_finished(filepath, count=1):
+        nonlocal done
+        if filepath and extract_queue is not None:
+            extract_queue.put(filepath)
+        with done_lock:
+            done += count
+            current = done
+        progress_callback(current, total, start_time)
+
+    # every difficulty of a beatmapset shares one .osz, so fetch each set once and credit
+    # its result to all of its maps; concurrent fetches of one set would race on the file
+    groups = {}
     for m in missing_maps:
-        beatmapset_id = extract_beatmapset_id(m["url"])
-        if not beatmapset_id:
-            done += 1
-            progress_callback(done, total, start_time)
+        osz_name = _osz_filename(m)
+        if osz_name is None:
+            on_finished(None)
             continue
+        first, count = groups.get(osz_name[1], (m, 0))
+        groups[osz_name[1]] = (first, count + 1)
+    sets = list(groups.values())
 
-        download_url = f"{NERINYAN_BASE}{beatmapset_id}"
-        filename = f"{sanitize_filename(m['title'])} - {sanitize_filename(m['artist'])} [{beatmapset_id}].osz"
-        filepath = os.path.join(download_root, filename)
+    # prefer a single aiohttp event loop when it is installed; fall back to a thread pool
+    if aiohttp is not None:
+        asyncio.run(_download_all(sets, download_root, existing_files, on_finished))
+        return
 
-        # skip existing file
-        if os.path.exists(filepath):
-            done += 1
-            progress_callback(done, total, start_time)
-            continue
+    with ThreadPoolExecutor(max_workers=DOWNLOAD_WORKERS) as executor:
+        futures = {executor.submit(_download_one, SESSION, m, download_root, existing_files): count
+                   for m, count in sets}
+        for future in as_completed(futures):
+            try:
+                filepath = future.result()
+            except Exception:
+                # on failure, skip (we still count it to avoid stalling)
+                filepath = None
+            on_finished(filepath, futures[future])
+
+
+def _extract_one(osz_path, extract_folder, delete_after=False):
+    """Extract a single .osz archive into extract_folder, optionally deleting it afterwards."""
+    try:
+        # each worker opens its own ZipFile; instances are not safe to share across threads
+        with zipfile.ZipFile(osz_path, "r") as zip_ref:
+            zip_ref.extractall(extract_folder)
+    except Exception:
+        return
 
+    if delete_after:
         try:
-            with requests.get(download_url, stream=True, headers=HEADERS, timeout=30) as r:
-                r.raise_for_status()
-                total_length = int(r.headers.get('content-length', 0) or 0)
-                # guard small responses (likely error/HTML)
-                if total_length and total_length < 200_000:
-                    done += 1
-                    progress_callback(done, total, start_time)
-                    continue
-
-                with open(filepath, "wb") as f:
-                    for chunk in r.iter_content(chunk_size=8192):
-                        if chunk:
-                            f.write(chunk)
+            os.remove(osz_path)
         except Exception:
-            # on failure, skip (we still count it to avoid stalling)
             pass
 
-        done += 1
-        progress_callback(done, total, start_time)
+
+def _extract_from_queue(extract_queue, delete_after=False):
+    """Extract .osz paths taken from extract_queue, EXTRACT_WORKERS at a time, until a None sentinel arrives."""
+    with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as executor:
+        while True:
+            osz_path = extract_queue.get()
+            if osz_path is None:
+                # leaving the with block waits for the extractions still running
+                return
+            executor.submit(_extract_one, osz_path, osz_path[:-4], delete_after)
 
 
 def extract_osz_files(download_root, delete_after=False):
     """Extract .osz archives under download_root and optionally delete the .osz files."""
     if not os.path.isdir(download_root):
         return
-    osz_files = [f for f in os.listdir(download_root) if f.lower().endswith(".osz")]
-    for osz_file in osz_files:
-        osz_path = os.path.join(download_root, osz_file)
-        extract_folder = os.path.join(download_root, os.path.splitext(osz_file)[0])
-        try:
-            with zipfile.ZipFile(osz_path, "r") as zip_ref:
-                zip_ref.extractall(extract_folder)
-        except Exception:
-            pass
-
-    if delete_after:
-        for osz_file in osz_files:
-            try:
-                os.remove(os.path.join(download_root, osz_file))
-            except Exception:
-                pass
+    with os.scandir(download_root) as it:
+        entries = list(it)
+    # (osz path, folder path) per archive; scandir already joined the paths and
+    # the ".osz" suffix is a fixed 4 characters, so no per-file join/splitext is needed
+    osz_files = [(e.path, e.path[:-4]) for e in entries
+                 if e.is_file() and e.name.lower().endswith(".osz")]
+    with ThreadPoolExecutor(max_workers=EXTRACT_WORKERS) as executor:
+        for osz_path, extract_folder in osz_files:
+            executor.submit(_extract_one, osz_path, extract_folder, delete_after)
 
 
 # === Main background task ===
@@ -135,73 +529,114 @@ def start_download(selected_tables, level_ranges_int, auto_extract, output_path,
     selected_tables: list of table names (keys of JSON_URLS)
     level_ranges_int: dict name -> (min_int, max_int)
     """
+    # Tk is not thread-safe: task() runs on a worker thread and hands every widget or
+    # messagebox call to the main loop, via gui() or (when it needs the result) gui_wait()
+    def gui(fn, *args, **kwargs):
+        progress_bar.after(0, lambda: fn(*args, **kwargs))
+
+    def gui_wait(fn, *args, **kwargs):
+        result = queue.Queue(1)
+        gui(lambda: result.put(fn(*args, **kwargs)))
+        return result.get()
+
     def task():
-        start_button.config(state=tk.DISABLED)
-        progress_bar["value"] = 0
-        progress_bar.update()
-        status_label.config(text="Preparing...")
-        count_label.config(text="0/0")
-
-        existing_md5 = get_existing_md5()
-        if not existing_md5:
-            start_button.config(state=tk.NORMAL)
+        if not os.path.exists(SONGDATA_DB):
+            gui_wait(messagebox.showerror, "Error", f"Database not found: {SONGDATA_DB}")
+            gui(start_button.config, state=tk.NORMAL)
             return
 
-        # collect maps from selected tables and filter by integer range (min <= level <= max)
-        combined_maps = []
+        # collect maps from selected tables, filtered by integer range (min <= level <= max)
+        # and deduplicated by md5 (keep first) in the same pass
+        combined_maps = {}
         for table in selected_tables:
             url = JSON_URLS.get(table)
             if not url:
                 continue
+            min_i, max_i = level_ranges_int.get(table, (0, 20))
+            allowed = allowed_levels(min_i, max_i)
             try:
-                maps = get_all_maps(url)
+                # maps are streamed one at a time and matched against the allowed levels
+                for m in get_all_maps(url):
+                    md = m.get("md5")
+                    if md and m.get("level") in allowed:
+                        combined_maps.setdefault(md, m)
             except Exception as e:
-                messagebox.showerror("Error", f"Failed to load map list for {table}:\n{e}")
-                start_button.config(state=tk.NORMAL)
+                gui_wait(messagebox.showerror, "Error", f"Failed to load map list for {table}:\n{e}")
+                gui(start_button.config, state=tk.NORMAL)
                 return
 
-            min_i, max_i = level_ranges_int.get(table, (0, 20))
-            # levels are floats like 3, 3.5, 4; we include those between min_i and max_i inclusive
-            for m in maps:
-                lvl_str = m.get("level")
-                try:
-                    lvl = float(lvl_str)
-                except Exception:
-                    continue
-                if min_i <= lvl <= max_i:
-                    combined_maps.append(m)
-
-        # deduplicate by md5 (keep first)
-        seen_md5 = set()
-        unique_maps = []
-        for m in combined_maps:
-            md = m.get("md5")
-            if not md or md in seen_md5:
-                continue
-            seen_md5.add(md)
-            unique_maps.append(m)
-
-        missing_maps = [m for m in unique_maps if m.get("md5") not in existing_md5]
+        try:
+            missing_maps = get_missing_maps(combined_maps)
+        except sqlite3.Error as e:
+            gui_wait(messagebox.showerror, "Error", f"Failed to read {SONGDATA_DB}:\n{e}")
+            gui(start_button.config, state=tk.NORMAL)
+            return
         total_missing = len(missing_maps)
         if total_missing == 0:
-            messagebox.showinfo("Info", "All maps in the selected range are already present.")
-            start_button.config(state=tk.NORMAL)
-            status_label.config(text="Idle")
+            gui_wait(messagebox.showinfo, "Info", "All maps in the selected range are already present.")
+            gui(start_button.config, state=tk.NORMAL)
+            gui(status_label.config, text="Idle")
             return
 
         # confirm
-        ok = messagebox.askyesno("Confirm download", f"{total_missing} maps missing.\nDownload now?")
+        ok = gui_wait(messagebox.askyesno, "Confirm download", f"{total_missing} maps missing.\nDownload now?")
         if not ok:
-            start_button.config(state=tk.NORMAL)
-            status_label.config(text="Cancelled")
+            gui(start_button.config, state=tk.NORMAL)
+            gui(status_label.config, text="Cancelled")
             return
 
-        # progress callback
-        start_time = time.time()
+        # progress is only queued here; the Tk main loop picks it up in drain_progress
         def progress_callback(done, total, start_time_inner):
+            progress_queue.put((done, total, start_time_inner))
+
+        # with auto extract, archives are extracted while the rest download
+        extract_queue = None
+        if auto_extract:
+            extract_queue = queue.Queue(maxsize=EXTRACT_QUEUE_SIZE)
+            extractor = threading.Thread(target=_extract_from_queue, args=(extract_queue, True), daemon=True)
+            extractor.start()
+
+        # run download
+        download_missing_maps(missing_maps, output_path, progress_callback, extract_queue)
+        finish_progress()
+
+        # extraction
+        if auto_extract:
+            gui(status_label.config, text="Extracting...")
+            extract_queue.put(None)
+            extractor.join()
+            gui_wait(messagebox.showinfo, "Done", "All downloads extracted and .osz files deleted.")
+        else:
+            gui(status_label.config, text="Download complete.")
+            ext = gui_wait(messagebox.askyesno, "Extract now?", "Do you want to extract downloaded .osz files now?")
+            if ext:
+                extract_osz_files(output_path, delete_after=False)
+                gui_wait(messagebox.showinfo, "Done", "Extraction complete.")
+
+        gui(start_button.config, state=tk.NORMAL)
+        gui(status_label.config, text="Idle")
+
+    progress_queue = queue.Queue()
+    progress_drained = threading.Event()
+
+    def drain_progress():
+        # apply only the newest update, at most every PROGRESS_INTERVAL_MS
+        latest = None
+        finished = False
+        while True:
+            try:
+                item = progress_queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is None:
+                finished = True
+                break
+            latest = item
+
+        if latest is not None:
+            done, total, start_time_inner = latest
             fraction = (done / total) if total else 1.0
             progress_bar["value"] = fraction * 100
-            progress_bar.update()
             # ETA estimation
             elapsed = time.time() - start_time_inner
             avg = elapsed / done if done > 0 else 0
@@ -210,25 +645,29 @@ def start_download(selected_tables, level_ranges_int, auto_extract, output_path,
             status_label.config(text=f"{done}/{total} maps | ETA: {mins}m {secs}s")
             count_label.config(text=f"{done}/{total}")
 
-        # run download
-        download_missing_maps(missing_maps, output_path, progress_callback)
-
-        # extraction
-        if auto_extract:
-            status_label.config(text="Extracting...")
-            extract_osz_files(output_path, delete_after=True)
-            messagebox.showinfo("Done", "All downloads extracted and .osz files deleted.")
+        if finished:
+            progress_drained.set()
         else:
-            status_label.config(text="Download complete.")
-            ext = messagebox.askyesno("Extract now?", "Do you want to extract downloaded .osz files now?")
-            if ext:
-                extract_osz_files(output_path, delete_after=False)
-                messagebox.showinfo("Done", "Extraction complete.")
+            progress_bar.after(PROGRESS_INTERVAL_MS, drain_progress)
+
+    def finish_progress():
+        # flush the last update before the worker writes its own status text
+        progress_queue.put(None)
+        progress_drained.wait()
+
+    def run():
+        try:
+            task()
+        finally:
+            progress_queue.put(None)
 
-        start_button.config(state=tk.NORMAL)
-        status_label.config(text="Idle")
+    start_button.config(state=tk.DISABLED)
+    progress_bar["value"] = 0
+    status_label.config(text="Preparing...")
+    count_label.config(text="0/0")
 
-    threading.Thread(target=task, daemon=True).start()
+    progress_bar.after(PROGRESS_INTERVAL_MS, drain_progress)
+    threading.Thread(target=run, daemon=True).start()
 
 
 # === GUI ===